@@ -1,24 +1,164 @@
+import atexit
+from datetime import date
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
 from models import db
 from routes import register_routes
 
-def create_app():
+# Bump whenever models.py changes the schema. Stored in the database file as
+# PRAGMA user_version. This is not a migration: create_all() never alters existing
+# tables, so a database at another version must be re-created or re-seeded.
+SCHEMA_VERSION = 10
+
+# Issued once per new DB-API connection (not per request)
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+    "cache_size=-65536",
+    "busy_timeout=5000",
+    "foreign_keys=ON",
+)
+
+try:
+    import orjson
+except ImportError:  # optional accelerator; stdlib json is used without it
+    orjson = None
+
+try:
+    from flask_compress import Compress
+except ImportError:  # optional; responses are sent uncompressed without it
+    Compress = None
+
+
+class StagecraftJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes with orjson when installed.
+    Datetimes are always emitted as ISO-8601 strings, on both code paths.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def _encode(self, obj, sort_keys, indent, option=0):
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj, kwargs.get("sort_keys", self.sort_keys), kwargs.get("indent")).decode()
+
+    def response(self, *args, **kwargs):
+        # jsonify(): hand orjson's bytes straight to the response instead of
+        # decoding to str only for Werkzeug to encode it back to UTF-8
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        body = self._encode(obj, self.sort_keys, pretty, orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def stamp_schema_version(engine):
+    """Record SCHEMA_VERSION in a database that create_all() just built."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def create_app(check_schema=True):
     app = Flask(__name__)
-    
+
+    app.json = StagecraftJSONProvider(app)
+
     app.secret_key = 'super_secret_stagecraft_key'
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///stagecraft.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
+    app.config.setdefault('AUTO_CREATE_TABLES', True)
+    # Oversized bodies (e.g. huge code pushes) are refused with 413 before any handler runs
+    app.config.setdefault('MAX_CONTENT_LENGTH', 2 * 1024 * 1024)
+    # Keep SQLite connections open across requests instead of re-opening the file
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        "poolclass": QueuePool,
+        "pool_size": 20,
+        "max_overflow": 40,
+        "pool_recycle": 1800,
+        "pool_timeout": 10,      # fail fast instead of queueing 30s on an exhausted pool
+        "pool_pre_ping": True,
+        "pool_use_lifo": True,   # reuse the warmest connection (hot page cache / mmap)
+        "connect_args": {"check_same_thread": False},
+    }
+
+    # br/gzip for JSON and HTML bodies (streamed list responses included)
+    app.config.setdefault('COMPRESS_ALGORITHM', ['br', 'gzip'])
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    if Compress is not None:
+        Compress(app)
+
     db.init_app(app)
-    
+
     with app.app_context():
-        db.create_all()
-    
+        @event.listens_for(db.engine, "connect")
+        def _set_sqlite_pragmas(dbapi_conn, _connection_record):
+            cursor = dbapi_conn.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(f"PRAGMA {pragma}")
+            cursor.close()
+
+        # Warm boots skip create_all()'s per-table introspection when the file
+        # is already at the current version. Only an empty database is built
+        # and stamped; one built by an older models.py is refused, never marked
+        # current. SEED.PY passes check_schema=False because it rebuilds the file.
+        if check_schema:
+            with db.engine.connect() as conn:
+                version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+                has_tables = conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' LIMIT 1"
+                ).first() is not None
+            if version != SCHEMA_VERSION and has_tables:
+                raise RuntimeError(
+                    f"Database schema is version {version}, this build expects {SCHEMA_VERSION}. "
+                    "Re-create or re-seed the database (python SEED.PY)."
+                )
+            if app.config['AUTO_CREATE_TABLES'] and not has_tables:
+                db.create_all()
+                stamp_schema_version(db.engine)
+
+        # Refresh planner statistics for tables whose shape changed this run
+        engine = db.engine
+
+        def _optimize_on_exit():
+            with engine.connect() as conn:
+                conn.exec_driver_sql("PRAGMA optimize")
+
+        atexit.register(_optimize_on_exit)
+
+    @app.cli.command("db-analyze")
+    def db_analyze():
+        """Rebuild SQLite planner statistics (run nightly from cron)."""
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+            conn.exec_driver_sql("PRAGMA optimize")
+        print("✅ ANALYZE + PRAGMA optimize complete.")
+
     register_routes(app)
-    
+
     return app
 
 if __name__ == "__main__":
     app = create_app()
-    app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
+    app.run(debug=True, host="0.0.0.0", port=5000)
@@ -1,15 +1,52 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Index, UniqueConstraint, func
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Session, column_property
+from sqlalchemy import DDL, Index, UniqueConstraint, column, event, func, insert, select, text
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-import uuid
+import functools
+import hashlib
+import operator
+import secrets
+import zlib
 
 db = SQLAlchemy()
 
 
 def short_uuid():
-    """Short unique identifier – useful for external references or short URLs."""
-    return str(uuid.uuid4())[:10]
+    """Short unique identifier – useful for external references or short URLs.
+    Stored as 5 raw bytes; hex-encode (10 chars) for display."""
+    return secrets.token_bytes(5)
+
+
+_STAGE_INDEX = None
+
+
+def _stage_index():
+    """validators.STAGE_INDEX, fetched on first use (late import avoids circular import)."""
+    global _STAGE_INDEX
+    if _STAGE_INDEX is None:
+        from validators import STAGE_INDEX
+        _STAGE_INDEX = STAGE_INDEX
+    return _STAGE_INDEX
+
+
+def _dict_serializer(*fields):
+    """
+    Build a model's to_dict() once, at class-definition time.
+
+    Entries are output keys, or (key, attribute) pairs when the two differ.
+    All values are read with a single attrgetter call; datetimes are left
+    as-is for the app's JSON provider to encode.
+    """
+    pairs = [f if isinstance(f, tuple) else (f, f) for f in fields]
+    keys = tuple(key for key, _ in pairs)
+    get = operator.attrgetter(*(attr for _, attr in pairs))
+
+    def to_dict(self):
+        return dict(zip(keys, get(self)))
+
+    return to_dict
 
 
 class User(db.Model):
@@ -28,8 +65,55 @@ class User(db.Model):
             return False
         return check_password_hash(self.password_hash, password)
 
-    def to_dict(self):
-        return {"id": self.id, "username": self.username, "role": self.role}
+    to_dict = _dict_serializer("id", "username", "role")
+
+
+# ────────────────────────────────────────────────
+#  Data epoch
+#  Bumped after every committed transaction (ORM and Core writes alike),
+#  so read-side caches can tell whether anything changed since they were filled.
+# ────────────────────────────────────────────────
+_DATA_EPOCH = 0
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_data_epoch(session):
+    global _DATA_EPOCH
+    _DATA_EPOCH += 1
+
+
+def data_epoch():
+    return _DATA_EPOCH
+
+
+# ────────────────────────────────────────────────
+#  User role cache
+#  Roles change rarely but are read on every permission check.
+#  Any User write bumps the generation, which invalidates all cached entries.
+# ────────────────────────────────────────────────
+_USER_CACHE_GEN = 0
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _bump_user_cache(mapper, connection, target):
+    global _USER_CACHE_GEN
+    _USER_CACHE_GEN += 1
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_user_role(user_id, generation):
+    return db.session.execute(
+        select(User.role).where(User.id == user_id)
+    ).scalar_one_or_none()
+
+
+def get_user_role(user_id):
+    """Role of the given user id, or None if unknown."""
+    if user_id is None:
+        return None
+    return _cached_user_role(int(user_id), _USER_CACHE_GEN)
 
 
 class Project(db.Model):
@@ -39,7 +123,7 @@ class Project(db.Model):
     name = db.Column(db.String(100), nullable=False, unique=True)
     description = db.Column(db.Text)
     sdlc_practice = db.Column(db.String(50), nullable=False, default="Agile")
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
 
     work_items = db.relationship(
         'WorkItem',
@@ -49,62 +133,72 @@ class Project(db.Model):
         lazy='select'
     )
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "description": self.description,
-            "created_at": self.created_at.isoformat() if self.created_at else None
-        }
+    to_dict = _dict_serializer("id", "name", "description", "created_at")
+
+
+# Columns emitted by WorkItem.to_dict(), fetched in one attrgetter call
+_WI_KEYS = (
+    "id", "public_id", "project_id", "title", "current_stage",
+    "priority", "assignee", "regression_count", "transition_count", "created_at",
+)
+# Same order as _WI_KEYS; public_id is exposed hex-encoded
+_wi_get = operator.attrgetter(
+    "id", "public_id_hex", "project_id", "title", "current_stage",
+    "priority", "assignee", "regression_count", "transition_count", "created_at",
+)
 
 
 class WorkItem(db.Model):
     __tablename__ = 'work_items'
 
     id = db.Column(db.Integer, primary_key=True)
-    public_id = db.Column(db.String(12), unique=True, nullable=False, default=short_uuid, index=True)
+    public_id = db.Column(db.LargeBinary(5), unique=True, nullable=False, default=short_uuid, index=True)
 
     project_id = db.Column(
         db.Integer,
         db.ForeignKey('projects.id', ondelete='CASCADE'),
         nullable=False,
-        default=1,
-        index=True
+        default=1
     )
 
     title = db.Column(db.String(200), nullable=False, index=True)
     description = db.Column(db.Text)
+    # Board card text, maintained whenever description is assigned (see below)
+    description_snippet = db.Column(db.String(83), nullable=False, default="")
 
-    current_stage = db.Column(db.String(50), nullable=False, default="Requirement", index=True)
+    current_stage = db.Column(db.String(50), nullable=False, default="Requirement")
+
+    # Governance & analytics fields: regression_count / transition_count are
+    # derived from transition_logs (see bottom of module)
 
-    # Governance & analytics fields
-    regression_count = db.Column(db.Integer, nullable=False, default=0)
-    transition_count  = db.Column(db.Integer, nullable=False, default=0)
-    
     priority = db.Column(db.String(20), nullable=False, default="Medium")
     assignee = db.Column(db.String(100), nullable=True, default="Unassigned")
 
-    created_at  = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created_at  = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp(), index=True)
     updated_at  = db.Column(
         db.DateTime,
         nullable=False,
-        default=datetime.utcnow,
+        server_default=func.current_timestamp(),
         onupdate=func.current_timestamp()
     )
     last_transition_at = db.Column(db.DateTime, nullable=True)
+    # When the item entered current_stage; kept in step with each transition so
+    # stage aging never has to search transition_logs
+    stage_entered_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
 
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
 
     # Relationships
-    project = db.relationship('Project', back_populates='work_items')
-    owner = db.relationship('User', foreign_keys=[owner_id])
+    project = db.relationship('Project', back_populates='work_items', lazy='joined')
+    owner = db.relationship('User', foreign_keys=[owner_id], lazy='joined')
 
     artifacts = db.relationship(
         'Artifact',
         back_populates='work_item',
         cascade='all, delete-orphan',
         passive_deletes=True,
-        lazy='select'
+        lazy='selectin',
+        order_by='[Artifact.created_at.asc(), Artifact.id.asc()]'
     )
 
     transition_logs = db.relationship(
@@ -112,7 +206,7 @@ class WorkItem(db.Model):
         back_populates='work_item',
         cascade='all, delete-orphan',
         passive_deletes=True,
-        lazy='select',
+        lazy='selectin',
         order_by='TransitionLog.transitioned_at.asc()'
     )
 
@@ -121,8 +215,8 @@ class WorkItem(db.Model):
         back_populates='work_item',
         cascade='all, delete-orphan',
         passive_deletes=True,
-        lazy='select',
-        order_by='Comment.created_at.asc()'
+        lazy='selectin',
+        order_by='[Comment.created_at.asc(), Comment.id.asc()]'
     )
 
     code_files = db.relationship(
@@ -130,41 +224,99 @@ class WorkItem(db.Model):
         back_populates='work_item',
         cascade='all, delete-orphan',
         passive_deletes=True,
-        lazy='select',
+        lazy='selectin',
         order_by='CodeFile.updated_at.desc()'
     )
 
+    approvals = db.relationship(
+        'Approval',
+        back_populates='work_item',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+        lazy='selectin'
+    )
+
+    # current_stage / project_id lookups are served by the leading columns of these composites
     __table_args__ = (
         Index('ix_workitem_stage_created', 'current_stage', 'created_at'),
+        Index('ix_workitem_project_stage_created', 'project_id', 'current_stage', 'created_at'),
     )
 
+    @hybrid_property
+    def public_id_hex(self):
+        return self.public_id.hex() if self.public_id else None
+
+    @public_id_hex.expression
+    def public_id_hex(cls):
+        return func.lower(func.hex(cls.public_id))
+
     def __repr__(self):
         return f"<WorkItem #{self.id} '{self.title[:35]}…' stage={self.current_stage}>"
 
     def to_dict(self, detailed=False):
-        base = {
-            "id": self.id,
-            "public_id": self.public_id,
-            "project_id": self.project_id,
-            "title": self.title,
-            "current_stage": self.current_stage,
-            "priority": self.priority,
-            "assignee": self.assignee,
-            "regression_count": self.regression_count,
-            "transition_count": self.transition_count,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
+        base = dict(zip(_WI_KEYS, _wi_get(self)))
         if detailed:
             base.update({
                 "description": self.description,
-                "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-                "last_transition_at": (
-                    self.last_transition_at.isoformat() if self.last_transition_at else None
-                ),
+                "updated_at": self.updated_at,
+                "last_transition_at": self.last_transition_at,
             })
         return base
 
 
+SNIPPET_LENGTH = 80
+
+
+@event.listens_for(WorkItem.description, 'set')
+def _sync_description_snippet(target, value, _oldvalue, _initiator):
+    text = value or ""
+    target.description_snippet = text[:SNIPPET_LENGTH] + ("..." if len(text) > SNIPPET_LENGTH else "")
+
+
+# ────────────────────────────────────────────────
+#  Full-text search over WorkItem title/description
+#  External-content FTS5 table kept in sync by triggers (SQLite only).
+# ────────────────────────────────────────────────
+_WORKITEM_FTS_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS workitem_fts USING fts5(
+        title, description,
+        content='work_items', content_rowid='id', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS work_items_ai AFTER INSERT ON work_items BEGIN
+        INSERT INTO workitem_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS work_items_ad AFTER DELETE ON work_items BEGIN
+        INSERT INTO workitem_fts(workitem_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS work_items_au AFTER UPDATE OF title, description ON work_items BEGIN
+        INSERT INTO workitem_fts(workitem_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO workitem_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+)
+
+for _stmt in _WORKITEM_FTS_DDL:
+    event.listen(WorkItem.__table__, 'after_create', DDL(_stmt).execute_if(dialect='sqlite'))
+event.listen(
+    WorkItem.__table__, 'before_drop',
+    DDL("DROP TABLE IF EXISTS workitem_fts").execute_if(dialect='sqlite')
+)
+
+
+def search_workitem_ids(query: str):
+    """
+    Sub-select of WorkItem ids matching `query` (every word, prefix match).
+    Words are quoted so user input can never be parsed as FTS5 syntax.
+    """
+    terms = " ".join('"' + word.replace('"', '""') + '"*' for word in query.split())
+    return text(
+        "SELECT rowid FROM workitem_fts WHERE workitem_fts MATCH :terms"
+    ).bindparams(terms=terms).columns(column('rowid'))
+
+
 class Comment(db.Model):
     __tablename__ = 'comments'
 
@@ -172,22 +324,27 @@ class Comment(db.Model):
     work_item_id = db.Column(
         db.Integer,
         db.ForeignKey('work_items.id', ondelete='CASCADE'),
-        nullable=False,
-        index=True
+        nullable=False
     )
     author = db.Column(db.String(100), nullable=False, default="User")
     content = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
 
     work_item = db.relationship('WorkItem', back_populates='comments')
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "author": self.author,
-            "content": self.content,
-            "created_at": self.created_at.isoformat() if self.created_at else None
-        }
+    __table_args__ = (
+        Index('ix_comment_workitem_created', 'work_item_id', 'created_at'),
+    )
+
+    to_dict = _dict_serializer("id", "author", "content", "created_at")
+
+    @classmethod
+    def bulk_create(cls, rows):
+        """Insert many rows as one executemany + one commit (no per-row unit-of-work)."""
+        if not rows:
+            return
+        db.session.execute(insert(cls), rows)
+        db.session.commit()
 
 
 class CodeFile(db.Model):
@@ -197,24 +354,61 @@ class CodeFile(db.Model):
     work_item_id = db.Column(
         db.Integer,
         db.ForeignKey('work_items.id', ondelete='CASCADE'),
-        nullable=False,
-        index=True
+        nullable=False
     )
     filename = db.Column(db.String(255), nullable=False)
     branch = db.Column(db.String(100), nullable=False, default="main")
-    content = db.Column(db.Text, nullable=False, default="")
-    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Source text is stored zlib-compressed; read/write it through the `content` property
+    content_zlib = db.Column(db.LargeBinary, nullable=True)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    sha256 = db.Column(db.String(64), nullable=True)
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        server_default=func.current_timestamp(),
+        onupdate=func.current_timestamp()
+    )
 
     work_item = db.relationship('WorkItem', back_populates='code_files')
 
-    def to_dict(self):
+    __table_args__ = (
+        UniqueConstraint('work_item_id', 'branch', 'filename', name='uq_codefile_path'),
+        Index('ix_codefile_workitem_updated', 'work_item_id', 'updated_at'),
+    )
+
+    @staticmethod
+    def encode_content(text):
+        """Column values (compressed bytes, size, digest) for the given source text."""
+        raw = (text or "").encode("utf-8")
         return {
+            "content_zlib": zlib.compress(raw),
+            "size_bytes": len(raw),
+            "sha256": hashlib.sha256(raw).hexdigest(),
+        }
+
+    @property
+    def content(self):
+        if not self.content_zlib:
+            return ""
+        return zlib.decompress(self.content_zlib).decode("utf-8")
+
+    @content.setter
+    def content(self, text):
+        for column, value in self.encode_content(text).items():
+            setattr(self, column, value)
+
+    def to_dict(self, detailed=False):
+        base = {
             "id": self.id,
             "filename": self.filename,
             "branch": self.branch,
-            "content": self.content,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+            "size_bytes": self.size_bytes,
+            "sha256": self.sha256,
+            "updated_at": self.updated_at
         }
+        if detailed:
+            base["content"] = self.content
+        return base
 
 
 class WorkspaceBranch(db.Model):
@@ -229,25 +423,19 @@ class WorkspaceBranch(db.Model):
     work_item_id = db.Column(
         db.Integer,
         db.ForeignKey('work_items.id', ondelete='CASCADE'),
-        nullable=False,
-        index=True
+        nullable=False
     )
     name = db.Column(db.String(100), nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
     created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     is_merged = db.Column(db.Boolean, nullable=False, default=False)
 
+    # Also serves plain work_item_id lookups (leading column)
     __table_args__ = (
         UniqueConstraint('work_item_id', 'name', name='uq_workspace_branch_per_item'),
     )
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "work_item_id": self.work_item_id,
-            "name": self.name,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
+    to_dict = _dict_serializer("id", "work_item_id", "name", "created_at")
 
 
 class Artifact(db.Model):
@@ -258,8 +446,7 @@ class Artifact(db.Model):
     work_item_id = db.Column(
         db.Integer,
         db.ForeignKey('work_items.id', ondelete='CASCADE'),
-        nullable=False,
-        index=True
+        nullable=False
     )
 
     stage = db.Column(db.String(50), nullable=False, index=True)
@@ -269,38 +456,62 @@ class Artifact(db.Model):
     reference = db.Column(db.String(500), nullable=True)
     
     # NEW: File metadata for artifact versioning / upload
-    file_blob = db.Column(db.LargeBinary, nullable=True) # Could store real file content
+    # Payload lives in artifact_blobs so artifact listings never drag file bytes through the page cache
+    has_file = db.Column(db.Boolean, nullable=False, default=False)
     version = db.Column(db.Integer, nullable=False, default=1)
     is_locked = db.Column(db.Boolean, nullable=False, default=False)
 
     # Human-readable note / justification
     comment = db.Column(db.Text, nullable=True)
 
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
 
     # Relationship
     work_item = db.relationship('WorkItem', back_populates='artifacts')
+    blob = db.relationship(
+        'ArtifactBlob',
+        uselist=False,
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+        lazy='select'   # only fetched when a caller actually reads .blob
+    )
 
+    # Every artifact lookup is scoped to one work item. The (item, stage, type)
+    # unique constraint rejects duplicates at INSERT time and its index serves
+    # the completeness probes; (item, created_at) serves the ordered fetches
     __table_args__ = (
-        Index('ix_artifact_stage_type', 'stage', 'artifact_type'),
+        UniqueConstraint('work_item_id', 'stage', 'artifact_type', name='uq_artifact_workitem_stage_type'),
+        Index('ix_artifact_workitem_created', 'work_item_id', 'created_at'),
     )
 
     def __repr__(self):
         ref = f" ref={self.reference[:20]}…" if self.reference else ""
         return f"<Artifact {self.artifact_type}{ref} @ {self.stage} WI#{self.work_item_id} v{self.version}>"
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "type": self.artifact_type,
-            "stage": self.stage,
-            "reference": self.reference,
-            "comment": self.comment,
-            "version": self.version,
-            "is_locked": self.is_locked,
-            "has_file": self.file_blob is not None,
-            "created_at": self.created_at.isoformat() if self.created_at else None
-        }
+    def attach_file(self, data):
+        self.blob = ArtifactBlob(data=data)
+        self.has_file = True
+
+    to_dict = _dict_serializer(
+        "id", ("type", "artifact_type"), "stage", "reference", "comment",
+        "version", "is_locked", "has_file", "created_at"
+    )
+
+
+class ArtifactBlob(db.Model):
+    """
+    Raw file content for an Artifact, kept in a sibling table so that
+    SELECTs on `artifacts` stay small.
+    """
+
+    __tablename__ = 'artifact_blobs'
+
+    artifact_id = db.Column(
+        db.Integer,
+        db.ForeignKey('artifacts.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    data = db.Column(db.LargeBinary, nullable=False)
 
 
 class Approval(db.Model):
@@ -320,23 +531,17 @@ class Approval(db.Model):
     approved_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     status = db.Column(db.String(20), nullable=False, default="Pending") # Pending, Approved, Rejected
     
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
     
     # Signature / trace
     digital_signature = db.Column(db.String(64), nullable=True)
 
-    work_item = db.relationship('WorkItem', backref=db.backref('approvals', cascade='all, delete-orphan'))
+    work_item = db.relationship('WorkItem', back_populates='approvals')
     # Optional: approver relationship
     
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "stage": self.stage,
-            "required_role": self.required_role,
-            "status": self.status,
-            "digital_signature": self.digital_signature,
-            "created_at": self.created_at.isoformat() if self.created_at else None
-        }
+    to_dict = _dict_serializer(
+        "id", "stage", "required_role", "status", "digital_signature", "created_at"
+    )
 
 
 class TransitionLog(db.Model):
@@ -347,8 +552,7 @@ class TransitionLog(db.Model):
     work_item_id = db.Column(
         db.Integer,
         db.ForeignKey('work_items.id', ondelete='CASCADE'),
-        nullable=False,
-        index=True
+        nullable=False
     )
 
     from_stage = db.Column(db.String(50), nullable=False)
@@ -357,6 +561,8 @@ class TransitionLog(db.Model):
     # Filled only on regressions (backward moves)
     reason = db.Column(db.Text, nullable=True)
 
+    # Python-side default on purpose: history is ordered by this column and
+    # CURRENT_TIMESTAMP only has one-second resolution
     transitioned_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
     # Future: audit trail enhancement
@@ -365,26 +571,62 @@ class TransitionLog(db.Model):
     # Relationship
     work_item = db.relationship('WorkItem', back_populates='transition_logs')
 
+    # Also serves plain work_item_id lookups, and "latest first" via a backward scan.
+    # (work_item_id, from_stage) answers the "was this stage ever exited" lock probe.
+    # The partial index holds only regression rows, for the metrics COUNT(DISTINCT).
     __table_args__ = (
         Index('ix_transition_workitem_time', 'work_item_id', 'transitioned_at'),
+        Index('ix_transition_workitem_from', 'work_item_id', 'from_stage'),
+        Index(
+            'ix_transition_regressions', 'work_item_id',
+            sqlite_where=text('reason IS NOT NULL')
+        ),
     )
 
     def __repr__(self):
         direction = "→" if self.to_stage_index() > self.from_stage_index() else "←"
         return f"<Transition WI#{self.work_item_id} {self.from_stage} {direction} {self.to_stage}>"
 
-    def to_dict(self):
-        return {
-            "from": self.from_stage,
-            "to": self.to_stage,
-            "reason": self.reason,
-            "timestamp": self.transitioned_at.isoformat() if self.transitioned_at else None
-        }
+    to_dict = _dict_serializer(
+        ("from", "from_stage"), ("to", "to_stage"), "reason", ("timestamp", "transitioned_at")
+    )
+
+    @classmethod
+    def bulk_create(cls, rows):
+        """Insert many rows as one executemany + one commit (no per-row unit-of-work)."""
+        if not rows:
+            return
+        db.session.execute(insert(cls), rows)
+        db.session.commit()
 
     def from_stage_index(self):
-        from validators import STAGES  # late import to avoid circular import
-        return STAGES.index(self.from_stage) if self.from_stage in STAGES else -1
+        return _stage_index().get(self.from_stage, -1)
 
     def to_stage_index(self):
-        from validators import STAGES
-        return STAGES.index(self.to_stage) if self.to_stage in STAGES else -1
\ No newline at end of file
+        return _stage_index().get(self.to_stage, -1)
+
+
+# ────────────────────────────────────────────────
+#  Derived WorkItem counters
+#  Counted from transition_logs via ix_transition_workitem_time instead of
+#  being stored, so a transition is a single INSERT. Deferred: only queried
+#  when accessed. Regressions are the logs that carry a justification.
+# ────────────────────────────────────────────────
+WorkItem.transition_count = column_property(
+    select(func.count(TransitionLog.id))
+    .where(TransitionLog.work_item_id == WorkItem.id)
+    .correlate_except(TransitionLog)
+    .scalar_subquery(),
+    deferred=True
+)
+
+WorkItem.regression_count = column_property(
+    select(func.count(TransitionLog.id))
+    .where(
+        TransitionLog.work_item_id == WorkItem.id,
+        TransitionLog.reason.isnot(None)
+    )
+    .correlate_except(TransitionLog)
+    .scalar_subquery(),
+    deferred=True
+)
@@ -1,17 +1,126 @@
-﻿from flask import request, jsonify, render_template, session, redirect, url_for
+﻿from flask import request, jsonify, render_template, stream_template, session, redirect, url_for, abort, Response, stream_with_context
+from datetime import datetime
 from functools import wraps
-from models import db, WorkItem, Artifact, TransitionLog, Comment, CodeFile, User, Project
+import hashlib
+import threading
+import time
+from sqlalchemy import Integer, cast, func, insert, literal, or_, select, tuple_, union, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only, raiseload, selectinload
+from models import (
+    db, WorkItem, Artifact, TransitionLog, Comment, CodeFile, WorkspaceBranch, User, Project,
+    data_epoch, get_user_role, search_workitem_ids
+)
 from validators import (
     validate_transition,
     can_add_artifact,
-    check_artifacts_complete,
+    DUPLICATE_ARTIFACT_MSG,
     STAGES,
-    REQUIRED_ARTIFACTS,
     get_stage_index
 )
 
+# SQLite allows one writer at a time; writers queue here instead of spinning
+# on busy_timeout while holding pooled connections. Readers never take it (WAL).
+_WRITE_LOCK = threading.Lock()
+
+# (artifact_type, reference, comment) auto-supplied by a simulated CI build
+PIPELINE_ARTIFACTS = (
+    ("Unit Test Coverage Report", "https://ci.devops.internal/coverage/938", "Auto-generated by Jenkins CI"),
+    ("Source Code Reference", "fb881d3", "Auto-merged PR by GitHub Actions"),
+    ("API Specification", "https://swagger.internal/auto", "Auto-generated Swagger spec"),
+)
+
+
 def register_routes(app):
 
+    # In-process cache for expensive read-only payloads. An entry is reused only
+    # while no transaction has committed since it was built, its TTL holds and
+    # (when given) the caller's `version` - e.g. a DB fingerprint - is unchanged.
+    _response_cache = {}
+
+    def cached_payload(key, ttl, build, version=None):
+        stamp = (data_epoch(), version)
+        now = time.monotonic()
+        hit = _response_cache.get(key)
+        if hit and hit[0] == stamp and hit[1] > now:
+            return hit[2]
+        payload = build()
+        _response_cache[key] = (stamp, now + ttl, payload)
+        return payload
+
+    def stream_json_array(batches):
+        """
+        Stream an iterable of lists as ONE JSON array, encoding a batch at a time,
+        so neither the rows nor the full JSON document are ever held in memory.
+        """
+        def generate():
+            yield "["
+            first = True
+            for batch in batches():
+                if not batch:
+                    continue
+                yield ("" if first else ",") + app.json.dumps(batch)[1:-1]
+                first = False
+            yield "]\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/json")
+
+    def conditional_response(etag, build_response):
+        """
+        build_response() tagged with a weak ETag. A matching If-None-Match
+        gets an empty 304 and build_response() is never called.
+        """
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = build_response()
+        response.set_etag(etag, weak=True)
+        return response
+
+    def conditional_json(state, build):
+        """
+        jsonify(build()) behind an ETag derived from `state` - a cheap DB
+        fingerprint of everything the payload depends on.
+        """
+        etag = hashlib.sha1(repr(tuple(state)).encode()).hexdigest()
+        return conditional_response(etag, lambda: jsonify(build()))
+
+    def conditional_json_stream(state, batches):
+        """stream_json_array(batches) behind an ETag derived from `state`."""
+        etag = hashlib.sha1(repr(tuple(state)).encode()).hexdigest()
+        return conditional_response(etag, lambda: stream_json_array(batches))
+
+    def child_fingerprint(model, work_item_id):
+        """count + max(id) of one item's child rows: changes on any insert or delete."""
+        return (
+            select(func.count(model.id)).where(model.work_item_id == work_item_id).scalar_subquery(),
+            select(func.max(model.id)).where(model.work_item_id == work_item_id).scalar_subquery(),
+        )
+
+    def workitem_row_or_404(id, *columns):
+        """
+        The given WorkItem columns as a plain row, or 404. Skips building an ORM
+        instance and its eager project/owner joins and collection loads.
+        """
+        row = db.session.execute(select(WorkItem.id, *columns).where(WorkItem.id == id)).first()
+        if row is None:
+            abort(404)
+        return row
+
+    def workspace_permissions(work_item):
+        """
+        (is_owner, is_admin, is_assignee) of the logged-in user for a work item.
+        The role comes from the session, falling back to the cached user lookup.
+        """
+        user_id = session.get('user_id')
+        user_role = session.get('role') or get_user_role(user_id) or "Developer"
+        return (
+            work_item.owner_id is not None and int(user_id) == int(work_item.owner_id),
+            user_role == 'Admin',
+            work_item.assignee == session.get('username'),
+        )
+
     def api_login_required(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
@@ -20,6 +129,15 @@ def register_routes(app):
             return f(*args, **kwargs)
         return decorated_function
 
+    def serialized_write(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method == "GET":
+                return f(*args, **kwargs)
+            with _WRITE_LOCK:
+                return f(*args, **kwargs)
+        return decorated_function
+
     # ────────────────────────────────────────────────
     #  1. Health / Root
     # ────────────────────────────────────────────────
@@ -33,6 +151,7 @@ def register_routes(app):
     # ────────────────────────────────────────────────
     @app.route("/workitems", methods=["POST"])
     @api_login_required
+    @serialized_write
     def create_workitem():
         data = request.get_json(silent=True) or {}
         
@@ -49,7 +168,12 @@ def register_routes(app):
         )
         
         db.session.add(work_item)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # foreign_keys=ON: an unseeded database has no default project to attach to
+            db.session.rollback()
+            return jsonify({"error": "Default project (id=1) does not exist; seed the database first"}), 400
 
         return jsonify({
             "message": "Work item created",
@@ -60,63 +184,159 @@ def register_routes(app):
 
     @app.route("/workitems", methods=["GET"])
     def list_workitems():
-        items = WorkItem.query.order_by(WorkItem.created_at.desc()).all()
-        
-        return jsonify([
-            {
-                "id": w.id,
-                "title": w.title,
-                "current_stage": w.current_stage,
-                "priority": w.priority,
-                "assignee": w.assignee,
-                "created_at": w.created_at.isoformat() if w.created_at else None
-            }
-            for w in items
-        ])
+        """
+        Newest first. Optional keyset pagination: ?limit=N (max 500) and
+        ?after=<id of the last item already seen> to fetch the next page.
+        """
+        # Plain column rows, shaped entirely in SQL: no ORM instances and no
+        # per-field Python conversion; created_at comes back as Unix epoch seconds (UTC)
+        stmt = (
+            select(
+                WorkItem.id,
+                WorkItem.title,
+                WorkItem.current_stage,
+                WorkItem.priority,
+                WorkItem.assignee,
+                cast(func.strftime('%s', WorkItem.created_at), Integer).label("created_at")
+            )
+            .order_by(WorkItem.created_at.desc(), WorkItem.id.desc())
+        )
+
+        after = request.args.get("after", type=int)
+        if after:
+            anchor_created = select(WorkItem.created_at).where(WorkItem.id == after).scalar_subquery()
+            stmt = stmt.where(tuple_(WorkItem.created_at, WorkItem.id) < tuple_(anchor_created, after))
+
+        limit = request.args.get("limit", type=int)
+        if limit:
+            stmt = stmt.limit(max(1, min(limit, 500)))
+
+        # Optional full-text filter on title/description (?q=...)
+        q = (request.args.get("q") or "").strip()
+        if q:
+            stmt = stmt.where(WorkItem.id.in_(search_workitem_ids(q)))
+
+        def batches():
+            result = db.session.execute(stmt.execution_options(yield_per=500))
+            for rows in result.partitions():
+                yield [dict(row._mapping) for row in rows]
+
+        # Any insert, delete or edit moves one of these (updated_at only has 1s
+        # resolution, so stage moves are also tracked by stage_entered_at); the
+        # query string is part of the URL the browser keys its cached copy on
+        state = db.session.execute(
+            select(
+                func.count(WorkItem.id),
+                func.max(WorkItem.id),
+                func.max(WorkItem.updated_at),
+                func.max(WorkItem.stage_entered_at)
+            )
+        ).one()
+        return conditional_json_stream(state, batches)
+
+
+    @app.route("/workitems/export", methods=["GET"])
+    def export_workitems():
+        """
+        Stream every work item as one JSON array.
+        Core rows (no ORM instances) fetched 500 at a time, so memory stays O(batch).
+        """
+        stmt = (
+            select(
+                WorkItem.id,
+                WorkItem.public_id_hex.label("public_id"),
+                WorkItem.project_id,
+                WorkItem.title,
+                WorkItem.description,
+                WorkItem.current_stage,
+                WorkItem.priority,
+                WorkItem.assignee,
+                WorkItem.owner_id,
+                WorkItem.created_at,
+                WorkItem.updated_at,
+                WorkItem.last_transition_at
+            )
+            .order_by(WorkItem.id)
+            .execution_options(yield_per=500)
+        )
+
+        def batches():
+            with db.engine.connect() as conn:
+                for rows in conn.execute(stmt).partitions():
+                    yield [dict(row._mapping) for row in rows]
+
+        return stream_json_array(batches)
 
 
     @app.route("/workitems/<int:id>", methods=["GET"])
     def get_workitem_detail(id):
-        work_item = WorkItem.query.get_or_404(id)
-
-        artifacts = Artifact.query.filter_by(work_item_id=id).order_by(Artifact.created_at).all()
-        history = TransitionLog.query.filter_by(work_item_id=id).order_by(TransitionLog.transitioned_at).all()
-        comments = Comment.query.filter_by(work_item_id=id).order_by(Comment.created_at.asc()).all()
+        state = db.session.execute(
+            select(
+                WorkItem.updated_at,
+                WorkItem.current_stage,
+                WorkItem.stage_entered_at,
+                *child_fingerprint(Artifact, id),
+                *child_fingerprint(TransitionLog, id),
+                *child_fingerprint(Comment, id)
+            ).where(WorkItem.id == id)
+        ).one_or_none()
+        if state is None:
+            abort(404)
+
+        def build():
+            # One SELECT for the item + one SELECT ... IN per child collection;
+            # collections this view doesn't render are never loaded
+            work_item = WorkItem.query.options(
+                selectinload(WorkItem.artifacts),
+                selectinload(WorkItem.transition_logs),
+                raiseload('*')
+            ).filter_by(id=id).first_or_404()
+
+            # Comments are emitted as stored, so they skip the ORM entirely:
+            # plain rows straight into the payload
+            comments = db.session.execute(
+                select(Comment.id, Comment.author, Comment.content, Comment.created_at)
+                .where(Comment.work_item_id == id)
+                .order_by(Comment.created_at.asc(), Comment.id.asc())
+            ).mappings()
+
+            return {
+                "id": work_item.id,
+                "title": work_item.title,
+                "description": work_item.description,
+                "current_stage": work_item.current_stage,
+                "priority": work_item.priority,
+                "assignee": work_item.assignee,
+                "created_at": work_item.created_at,
+                "artifacts": [
+                    {
+                        "type": a.artifact_type,
+                        "stage": a.stage,
+                        "reference": a.reference,
+                        "created_at": a.created_at
+                    } for a in work_item.artifacts
+                ],
+                "history": [
+                    {
+                        "from": h.from_stage,
+                        "to": h.to_stage,
+                        "reason": h.reason,
+                        "timestamp": h.transitioned_at
+                    } for h in work_item.transition_logs
+                ],
+                "comments": [dict(c) for c in comments]
+            }
 
-        return jsonify({
-            "id": work_item.id,
-            "title": work_item.title,
-            "description": work_item.description,
-            "current_stage": work_item.current_stage,
-            "priority": work_item.priority,
-            "assignee": work_item.assignee,
-            "created_at": work_item.created_at.isoformat() if work_item.created_at else None,
-            "artifacts": [
-                {
-                    "type": a.artifact_type,
-                    "stage": a.stage,
-                    "reference": a.reference,
-                    "created_at": a.created_at.isoformat() if a.created_at else None
-                } for a in artifacts
-            ],
-            "history": [
-                {
-                    "from": h.from_stage,
-                    "to": h.to_stage,
-                    "reason": h.reason,
-                    "timestamp": h.transitioned_at.isoformat() if h.transitioned_at else None
-                } for h in history
-            ],
-            "comments": [c.to_dict() for c in comments]
-        })
+        return conditional_json(state, build)
 
 
     # ────────────────────────────────────────────────
     #  3. Artifact Management
     # ────────────────────────────────────────────────
     @app.route("/workitems/<int:id>/artifact", methods=["POST"])
+    @serialized_write
     def add_artifact(id):
-        work_item = WorkItem.query.get_or_404(id)
+        work_item = db.get_or_404(WorkItem, id)
         data = request.get_json(silent=True) or {}
 
         artifact_type = data.get("artifact_type")
@@ -125,9 +345,11 @@ def register_routes(app):
         if not artifact_type:
             return jsonify({"error": "artifact_type is required"}), 400
 
+        stage = work_item.current_stage
+
         allowed, message = can_add_artifact(
             work_item=work_item,
-            stage=work_item.current_stage,
+            stage=stage,
             artifact_type=artifact_type,
             reference=reference
         )
@@ -141,13 +363,21 @@ def register_routes(app):
         # All checks passed → create
         artifact = Artifact(
             work_item_id=id,
-            stage=work_item.current_stage,
+            stage=stage,
             artifact_type=artifact_type,
             reference=reference.strip() if reference else None
         )
 
         db.session.add(artifact)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # No pre-check: uq_artifact_workitem_stage_type rejects a repeated type
+            db.session.rollback()
+            return jsonify({
+                "error": "Cannot add artifact",
+                "reason": DUPLICATE_ARTIFACT_MSG.format(artifact_type=artifact_type, stage=stage)
+            }), 400
 
         return jsonify({
             "message": "Artifact recorded",
@@ -156,7 +386,7 @@ def register_routes(app):
                 "type": artifact.artifact_type,
                 "stage": artifact.stage,
                 "reference": artifact.reference,
-                "created_at": artifact.created_at.isoformat()
+                "created_at": artifact.created_at
             }
         }), 201
 
@@ -165,10 +395,10 @@ def register_routes(app):
     #  3.5. Comment Management
     # ────────────────────────────────────────────────
     @app.route("/workitems/<int:id>/comment", methods=["POST"])
+    @serialized_write
     def add_comment(id):
-        work_item = WorkItem.query.get_or_404(id)
         data = request.get_json(silent=True) or {}
-        
+
         content = data.get("content")
         author = data.get("author", "User")
 
@@ -181,7 +411,12 @@ def register_routes(app):
             content=content
         )
         db.session.add(comment)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # No pre-fetch: the work_items FK rejects unknown ids
+            db.session.rollback()
+            abort(404)
 
         return jsonify({
             "message": "Comment added",
@@ -194,69 +429,79 @@ def register_routes(app):
     # ────────────────────────────────────────────────
     @app.route("/workitems/<int:id>/code", methods=["GET"])
     def get_code(id):
-        work_item = WorkItem.query.get_or_404(id)
+        workitem_row_or_404(id)
         branch = request.args.get("branch") or "main"
-        files = (
-            CodeFile.query.filter_by(work_item_id=id, branch=branch)
-            .order_by(CodeFile.updated_at.desc())
-            .all()
-        )
-        return jsonify([f.to_dict() for f in files])
+        state = db.session.execute(
+            select(
+                func.count(CodeFile.id),
+                func.max(CodeFile.id),
+                func.max(CodeFile.updated_at),
+                func.group_concat(CodeFile.sha256)
+            ).where(CodeFile.work_item_id == id, CodeFile.branch == branch)
+        ).one()
+
+        def build():
+            files = (
+                CodeFile.query.filter_by(work_item_id=id, branch=branch)
+                .order_by(CodeFile.updated_at.desc())
+                .all()
+            )
+            return [f.to_dict(detailed=True) for f in files]
+
+        return conditional_json(state, build)
 
     @app.route("/workitems/<int:id>/code", methods=["POST"])
     @api_login_required
+    @serialized_write
     def push_code(id):
-        work_item = WorkItem.query.get_or_404(id)
         data = request.get_json(silent=True) or {}
-        
+
         filename = data.get("filename")
         content = data.get("content", "")
         branch = data.get("branch") or "main"
 
         # Permission logic: Only the owner (workspace admin/assignee) or a global Admin can push to main
         if branch.lower() == "main":
-            user_id = session.get('user_id')
-            current_user = User.query.get(user_id)
-            user_role = session.get('role') or (current_user.role if current_user else "Developer")
-            
-            # Robust comparison (casting to int)
-            is_owner = (work_item.owner_id is not None and int(user_id) == int(work_item.owner_id))
-            is_admin = (user_role == 'Admin')
-            
-            # Also check if the current user is the assignee (as another definition of 'owner')
-            is_assignee = (work_item.assignee == session.get('username'))
-            
-            # DEBUG LOGGING (visible in terminal)
-            print(f"--- PUSH PERMISSION CHECK ---")
-            print(f"User ID: {user_id}, Username: {session.get('username')}, Role: {user_role}")
-            print(f"WorkItem Owner ID: {work_item.owner_id}, Assignee: {work_item.assignee}")
-            print(f"is_owner: {is_owner}, is_admin: {is_admin}, is_assignee: {is_assignee}")
-            
-            if not (is_owner or is_admin or is_assignee):
-                print(">>> PUSH BLOCKED: Not authorized for main branch")
+            work_item = workitem_row_or_404(id, WorkItem.owner_id, WorkItem.assignee)
+            # The assignee counts as another definition of 'owner'
+            is_owner, is_admin, is_assignee = workspace_permissions(work_item)
+            allowed = is_owner or is_admin or is_assignee
+
+            # Lazy %-formatting: nothing is built unless DEBUG logging is on
+            app.logger.debug(
+                "push to main on item %s by user %s (%s): owner=%s admin=%s assignee=%s -> %s",
+                id, session.get('user_id'), session.get('username'),
+                is_owner, is_admin, is_assignee, "allowed" if allowed else "blocked"
+            )
+
+            if not allowed:
                 return jsonify({"error": f"Only the owner ({work_item.assignee or 'authorized user'}) or an Admin can push to main"}), 403
-            print(">>> PUSH ALLOWED")
 
         if not filename:
             return jsonify({"error": "filename is required"}), 400
 
-        code_file = CodeFile.query.filter_by(
+        # Single-statement, race-free upsert on (work_item_id, branch, filename)
+        encoded = CodeFile.encode_content(content)
+        stmt = sqlite_insert(CodeFile).values(
             work_item_id=id,
             filename=filename,
-            branch=branch
-        ).first()
-        if code_file:
-            code_file.content = content
-        else:
-            code_file = CodeFile(
-                work_item_id=id,
-                filename=filename,
-                branch=branch,
-                content=content
-            )
-            db.session.add(code_file)
-            
-        db.session.commit()
+            branch=branch,
+            **encoded
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["work_item_id", "branch", "filename"],
+            set_={**encoded, "updated_at": func.current_timestamp()}
+        ).returning(CodeFile)
+
+        try:
+            code_file = db.session.scalars(
+                stmt, execution_options={"populate_existing": True}
+            ).one()
+            db.session.commit()
+        except IntegrityError:
+            # Non-main pushes skip the pre-fetch: the work_items FK rejects unknown ids
+            db.session.rollback()
+            abort(404)
 
         return jsonify({
             "message": "Code pushed successfully",
@@ -265,6 +510,7 @@ def register_routes(app):
 
 
     @app.route("/workitems/<int:id>/branches", methods=["GET", "POST"])
+    @serialized_write
     def manage_branches(id):
         """
         Lightweight branch management for the code workspace.
@@ -272,32 +518,20 @@ def register_routes(app):
         - GET:  returns distinct branch names for this work item
         - POST: creates a new branch by copying files from an existing branch (default: current 'main')
         """
-        work_item = WorkItem.query.get_or_404(id)
+        workitem_row_or_404(id)
 
         if request.method == "GET":
-            # Branches backed by files
-            branch_rows = (
-                db.session.query(CodeFile.branch)
-                .filter_by(work_item_id=id)
-                .distinct()
-                .all()
-            )
-            file_branches = {row[0] for row in branch_rows}
-
-            # Explicit branches with no files yet
-            meta_branches = {
-                b.name for b in WorkspaceBranch.query.filter_by(work_item_id=id).all()
-            }
-
-            existing = file_branches.union(meta_branches)
+            # Branches backed by files UNION explicit branches with no files yet:
+            # deduplicated and sorted by SQLite in one round-trip
+            names = union(
+                select(CodeFile.branch.label("name")).where(CodeFile.work_item_id == id),
+                select(WorkspaceBranch.name).where(WorkspaceBranch.work_item_id == id)
+            ).subquery()
+            branches = db.session.scalars(select(names.c.name).order_by(names.c.name)).all()
 
             # Always expose 'main' as a logical default branch
-            if not existing:
-                branches = ["main"]
-            else:
-                branches = sorted(existing)
-                if "main" not in branches:
-                    branches.insert(0, "main")
+            if "main" not in branches:
+                branches.insert(0, "main")
 
             return jsonify({"branches": branches})
 
@@ -314,18 +548,18 @@ def register_routes(app):
         if name.lower() == "main":
             return jsonify({"error": "Cannot create a branch named 'main'"}), 400
 
-        # Prevent duplicate branch creation – either in metadata or files
-        existing_meta = WorkspaceBranch.query.filter_by(
-            work_item_id=id,
-            name=name
-        ).first()
-        existing_files = (
-            db.session.query(CodeFile.id)
-            .filter_by(work_item_id=id, branch=name)
-            .first()
-        )
-
-        if existing_meta or existing_files:
+        # Prevent duplicate branch creation – either in metadata or files.
+        # Both probes are EXISTS subqueries answered in one round-trip.
+        branch_exists = db.session.scalar(select(or_(
+            select(WorkspaceBranch.id)
+            .where(WorkspaceBranch.work_item_id == id, WorkspaceBranch.name == name)
+            .exists(),
+            select(CodeFile.id)
+            .where(CodeFile.work_item_id == id, CodeFile.branch == name)
+            .exists()
+        )))
+
+        if branch_exists:
             return jsonify({"error": "Branch already exists"}), 400
 
         branch = WorkspaceBranch(work_item_id=id, name=name, created_by_id=session.get('user_id'))
@@ -342,12 +576,21 @@ def register_routes(app):
 
     @app.route("/workitems/<int:id>/merge", methods=["POST"])
     @api_login_required
+    @serialized_write
     def merge_code(id):
         """
         Merges code from a source branch into a target branch (default: main).
         Only the workspace creator or a global Admin can perform merges.
         """
-        work_item = WorkItem.query.get_or_404(id)
+        work_item = workitem_row_or_404(id, WorkItem.owner_id, WorkItem.assignee)
+
+        # Check permissions: Owner, Assignee, OR Global Admin.
+        # Doesn't depend on the body, so unauthorized callers are rejected unparsed.
+        is_owner, is_admin, is_assignee = workspace_permissions(work_item)
+
+        if not (is_owner or is_admin or is_assignee):
+            return jsonify({"error": "Only the workspace owner or an Admin can merge code"}), 403
+
         data = request.get_json(silent=True) or {}
         source_branch = (data.get("source_branch") or "").strip()
         target_branch = (data.get("target_branch") or "main").strip()
@@ -358,46 +601,42 @@ def register_routes(app):
         if source_branch.lower() == target_branch.lower():
             return jsonify({"error": "Source and target branches must be different"}), 400
 
-        # Check permissions: Owner, Assignee, OR Global Admin
-        user_id = session.get('user_id')
-        current_user = User.query.get(user_id)
-        user_role = session.get('role') or (current_user.role if current_user else "Developer")
-
-        is_owner = (work_item.owner_id is not None and int(user_id) == int(work_item.owner_id))
-        is_admin = (user_role == 'Admin')
-        is_assignee = (work_item.assignee == session.get('username'))
-
-        if not (is_owner or is_admin or is_assignee):
-            return jsonify({"error": "Only the workspace owner or an Admin can merge code"}), 403
-
-        # Github logic: copy all files from source branch to target branch
-        source_files = CodeFile.query.filter_by(work_item_id=id, branch=source_branch).all()
-        if not source_files:
+        # Github logic: copy all files from source branch to target branch.
+        # One INSERT ... SELECT ... ON CONFLICT upserts every file server-side;
+        # the compressed content is copied as-is, never loaded into Python.
+        columns = ["work_item_id", "filename", "branch", "content_zlib", "size_bytes", "sha256"]
+        stmt = sqlite_insert(CodeFile).from_select(
+            columns,
+            select(
+                CodeFile.work_item_id,
+                CodeFile.filename,
+                literal(target_branch),
+                CodeFile.content_zlib,
+                CodeFile.size_bytes,
+                CodeFile.sha256
+            ).where(CodeFile.work_item_id == id, CodeFile.branch == source_branch)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["work_item_id", "branch", "filename"],
+            set_={
+                "content_zlib": stmt.excluded.content_zlib,
+                "size_bytes": stmt.excluded.size_bytes,
+                "sha256": stmt.excluded.sha256,
+                "updated_at": func.current_timestamp()
+            }
+        )
+        files_merged = db.session.execute(stmt).rowcount
+        if not files_merged:
+            db.session.rollback()
             return jsonify({"error": f"No files found in source branch '{source_branch}'"}), 404
 
-        for s_file in source_files:
-            t_file = CodeFile.query.filter_by(
-                work_item_id=id, 
-                filename=s_file.filename, 
-                branch=target_branch
-            ).first()
-            
-            if t_file:
-                t_file.content = s_file.content
-            else:
-                t_file = CodeFile(
-                    work_item_id=id,
-                    filename=s_file.filename,
-                    branch=target_branch,
-                    content=s_file.content
-                )
-                db.session.add(t_file)
-        
         # Mark as merged if target is main
         if target_branch.lower() == "main":
-            source_meta = WorkspaceBranch.query.filter_by(work_item_id=id, name=source_branch).first()
-            if source_meta:
-                source_meta.is_merged = True
+            db.session.execute(
+                update(WorkspaceBranch)
+                .where(WorkspaceBranch.work_item_id == id, WorkspaceBranch.name == source_branch)
+                .values(is_merged=True)
+            )
 
         db.session.commit()
 
@@ -405,14 +644,15 @@ def register_routes(app):
             "message": f"Successfully merged '{source_branch}' into '{target_branch}'",
             "source": source_branch,
             "target": target_branch,
-            "files_merged": len(source_files)
+            "files_merged": files_merged
         })
 
 
     @app.route("/workitems/<int:id>/code/delete", methods=["POST"])
     @api_login_required
+    @serialized_write
     def delete_code_file(id):
-        work_item = WorkItem.query.get_or_404(id)
+        work_item = workitem_row_or_404(id, WorkItem.owner_id, WorkItem.assignee)
         data = request.get_json(silent=True) or {}
         filename = data.get("filename")
         branch_name = data.get("branch") or "main"
@@ -421,10 +661,7 @@ def register_routes(app):
             return jsonify({"error": "filename is required"}), 400
 
         user_id = session.get('user_id')
-        current_user = User.query.get(user_id)
-        user_role = session.get('role') or (current_user.role if current_user else "Developer")
-        is_owner = (work_item.owner_id is not None and int(user_id) == int(work_item.owner_id))
-        is_admin = (user_role == 'Admin')
+        is_owner, is_admin, _ = workspace_permissions(work_item)
 
         # Rule: Only owner/Admin can delete files in main
         if branch_name.lower() == "main":
@@ -459,8 +696,9 @@ def register_routes(app):
 
     @app.route("/workitems/<int:id>/branches/delete", methods=["POST"])
     @api_login_required
+    @serialized_write
     def delete_branch(id):
-        work_item = WorkItem.query.get_or_404(id)
+        work_item = workitem_row_or_404(id, WorkItem.owner_id, WorkItem.assignee)
         data = request.get_json(silent=True) or {}
         branch_name = data.get("name")
 
@@ -471,10 +709,7 @@ def register_routes(app):
             return jsonify({"error": "The main branch cannot be deleted"}), 400
 
         user_id = session.get('user_id')
-        current_user = User.query.get(user_id)
-        user_role = session.get('role') or (current_user.role if current_user else "Developer")
-        is_owner = (work_item.owner_id is not None and int(user_id) == int(work_item.owner_id))
-        is_admin = (user_role == 'Admin')
+        is_owner, is_admin, _ = workspace_permissions(work_item)
 
         branch_meta = WorkspaceBranch.query.filter_by(work_item_id=id, name=branch_name).first()
         is_branch_creator = (branch_meta and branch_meta.created_by_id is not None and int(user_id) == int(branch_meta.created_by_id))
@@ -503,8 +738,16 @@ def register_routes(app):
     # ────────────────────────────────────────────────
     @app.route("/workitems/<int:id>/transition", methods=["POST"])
     @api_login_required
+    @serialized_write
     def transition_stage(id):
-        work_item = WorkItem.query.get_or_404(id)
+        # Row lock (where the backend supports it) closes the read-validate-write race
+        work_item = db.session.get(
+            WorkItem, id,
+            options=[raiseload('*')],
+            with_for_update=True
+        )
+        if work_item is None:
+            abort(404)
         data = request.get_json(silent=True) or {}
 
         target_stage     = data.get("target_stage")
@@ -534,17 +777,32 @@ def register_routes(app):
                 "meta": extra
             }), status_code
 
-        # Transition is allowed → execute it
-        log = TransitionLog(
+        # Transition is allowed → execute it as two plain statements in one
+        # transaction (no unit-of-work bookkeeping for the new log row).
+        # The UPDATE only matches if the item is still in the stage that was
+        # validated, so a concurrent transition can't be applied twice.
+        now = datetime.utcnow()
+        from_stage = work_item.current_stage
+        moved = db.session.execute(
+            update(WorkItem)
+            .where(WorkItem.id == id, WorkItem.current_stage == from_stage)
+            .values(current_stage=target_stage, stage_entered_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not moved:
+            db.session.rollback()
+            return jsonify({
+                "blocked": True,
+                "reason": "Work item changed stage concurrently; reload and retry."
+            }), 409
+
+        db.session.execute(insert(TransitionLog).values(
             work_item_id=id,
-            from_stage=work_item.current_stage,
+            from_stage=from_stage,
             to_stage=target_stage,
-            reason=regression_reason if get_stage_index(target_stage) < get_stage_index(work_item.current_stage) else None
-        )
-
-        work_item.current_stage = target_stage
-
-        db.session.add(log)
+            reason=regression_reason if get_stage_index(target_stage) < get_stage_index(from_stage) else None,
+            transitioned_at=now
+        ))
         db.session.commit()
 
         return jsonify({
@@ -559,31 +817,42 @@ def register_routes(app):
     #  4.5. DevOps / CI-CD Pipeline Simulation
     # ────────────────────────────────────────────────
     @app.route("/workitems/<int:id>/pipeline/trigger", methods=["POST"])
+    @serialized_write
     def trigger_pipeline(id):
-        work_item = WorkItem.query.get_or_404(id)
+        work_item = workitem_row_or_404(id, WorkItem.current_stage)
         if work_item.current_stage != "Implementation":
             return jsonify({"error": "Pipeline can only be triggered in the Implementation stage"}), 400
             
-        # Auto-supply all required Implementation artifacts to simulate a CI build
-        if not Artifact.query.filter_by(work_item_id=id, stage="Implementation", artifact_type="Unit Test Coverage Report").first():
-            db.session.add(Artifact(work_item_id=id, stage="Implementation", artifact_type="Unit Test Coverage Report", reference="https://ci.devops.internal/coverage/938", comment="Auto-generated by Jenkins CI"))
-            
-        if not Artifact.query.filter_by(work_item_id=id, stage="Implementation", artifact_type="Source Code Reference").first():
-            db.session.add(Artifact(work_item_id=id, stage="Implementation", artifact_type="Source Code Reference", reference="fb881d3", comment="Auto-merged PR by GitHub Actions"))
-
-        if not Artifact.query.filter_by(work_item_id=id, stage="Implementation", artifact_type="API Specification").first():
-            db.session.add(Artifact(work_item_id=id, stage="Implementation", artifact_type="API Specification", reference="https://swagger.internal/auto", comment="Auto-generated Swagger spec"))
-            
-        # Auto-Transition to Testing
-        log = TransitionLog(
+        # Auto-supply all required Implementation artifacts to simulate a CI build:
+        # one SELECT for what already exists, one executemany INSERT for the rest
+        existing = set(db.session.scalars(
+            select(Artifact.artifact_type).where(
+                Artifact.work_item_id == id,
+                Artifact.stage == "Implementation"
+            )
+        ))
+        missing = [
+            {"work_item_id": id, "stage": "Implementation", "artifact_type": artifact_type, "reference": reference, "comment": comment}
+            for artifact_type, reference, comment in PIPELINE_ARTIFACTS
+            if artifact_type not in existing
+        ]
+        if missing:
+            db.session.execute(insert(Artifact), missing)
+
+        # Auto-Transition to Testing, as plain statements in the same transaction
+        now = datetime.utcnow()
+        db.session.execute(insert(TransitionLog).values(
             work_item_id=id,
             from_stage="Implementation",
             to_stage="Testing",
-            reason=None
+            reason=None,
+            transitioned_at=now
+        ))
+        db.session.execute(
+            update(WorkItem)
+            .where(WorkItem.id == id)
+            .values(current_stage="Testing", stage_entered_at=now)
         )
-        work_item.current_stage = "Testing"
-        
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
@@ -593,24 +862,70 @@ def register_routes(app):
     # ────────────────────────────────────────────────
     @app.route("/board", methods=["GET"])
     def stage_board():
-        board = {}
-        for stage in STAGES:
-            items = WorkItem.query.filter_by(current_stage=stage)\
-                                 .order_by(WorkItem.created_at.desc())\
-                                 .all()
-            board[stage] = [
-                {
-                    "id": item.id,
-                    "title": item.title,
-                    "description_snippet": (item.description or "")[:80] + ("..." if item.description else ""),
-                    "priority": item.priority,
-                    "assignee": item.assignee,
-                    # Optional: can add more flags later (overdue, regression_count, etc.)
-                }
-                for item in items
-            ]
-
-        return jsonify(board)
+        """
+        Work items bucketed by stage, newest first. Optional ?limit=N (max 500)
+        caps each stage's bucket to its N newest items.
+        """
+        state = db.session.execute(
+            select(
+                func.count(WorkItem.id),
+                func.max(WorkItem.id),
+                func.max(WorkItem.updated_at),
+                func.max(WorkItem.stage_entered_at)
+            )
+        ).one()
+        # Clamped before it keys the cache, so arbitrary ?limit values share a
+        # bounded set of cache entries
+        per_stage = request.args.get("limit", type=int)
+        per_stage = max(1, min(per_stage, 500)) if per_stage else None
+        # The fingerprint versions the cached board too, so a write made by
+        # another worker process is picked up on the next poll
+        return conditional_json(state, lambda: cached_payload(
+            ("board", per_stage), 10, lambda: build_board(per_stage), version=tuple(state)
+        ))
+
+    def build_board(per_stage):
+        # One ordered scan for every stage, bucketed in Python (per-stage order is preserved)
+        board = {stage: [] for stage in STAGES}
+        stmt = select(
+            WorkItem.id,
+            WorkItem.title,
+            WorkItem.description_snippet,
+            WorkItem.priority,
+            WorkItem.assignee,
+            WorkItem.current_stage,
+            WorkItem.created_at
+        ).where(WorkItem.current_stage.in_(STAGES))
+
+        if per_stage:
+            # Still one query: rank rows within each stage and keep the top N
+            ranked = stmt.add_columns(
+                func.row_number().over(
+                    partition_by=WorkItem.current_stage,
+                    order_by=(WorkItem.created_at.desc(), WorkItem.id.desc())
+                ).label("rn")
+            ).subquery()
+            stmt = (
+                select(ranked)
+                .where(ranked.c.rn <= per_stage)
+                .order_by(ranked.c.created_at.desc(), ranked.c.id.desc())
+            )
+        else:
+            stmt = stmt.order_by(WorkItem.created_at.desc(), WorkItem.id.desc())
+
+        rows = db.session.execute(stmt).all()
+
+        for item in rows:
+            board[item.current_stage].append({
+                "id": item.id,
+                "title": item.title,
+                "description_snippet": item.description_snippet,
+                "priority": item.priority,
+                "assignee": item.assignee,
+                # Optional: can add more flags later (overdue, regression_count, etc.)
+            })
+
+        return board
 
 
     # ────────────────────────────────────────────────
@@ -618,42 +933,60 @@ def register_routes(app):
     # ────────────────────────────────────────────────
     @app.route("/metrics", methods=["GET"])
     def get_metrics():
-        items_per_stage = {stage: WorkItem.query.filter_by(current_stage=stage).count() for stage in STAGES}
-        
-        total_items = WorkItem.query.count()
+        # The encoded body and its ETag are cached together, so pollers cost
+        # one dict lookup: a 304, or the same pre-encoded bytes
+        body, etag = cached_payload("metrics", 60, encode_metrics)
+        response = conditional_response(
+            etag, lambda: app.response_class(body, mimetype="application/json")
+        )
+        response.cache_control.max_age = 5
+        return response
+
+    def encode_metrics():
+        body = app.json.dumps(build_metrics())
+        return body, hashlib.sha1(body.encode()).hexdigest()
+
+    def build_metrics():
+        # Stage Aging: whole days (as timedelta.days) since each item entered its
+        # current stage, averaged per stage - all in SQL
+        age_days = cast(func.julianday('now') - func.julianday(WorkItem.stage_entered_at), Integer)
+
+        items_per_stage = {stage: 0 for stage in STAGES}
+        avg_aging_days = {stage: 0 for stage in STAGES}
+        total_items = 0
+        for stage, count, avg_age in db.session.execute(
+            select(WorkItem.current_stage, func.count(), func.avg(age_days))
+            .group_by(WorkItem.current_stage)
+        ):
+            total_items += count
+            if stage in items_per_stage:
+                items_per_stage[stage] = count
+                avg_aging_days[stage] = round(avg_age or 0, 1)
+
         total_transitions = TransitionLog.query.count()
-        
-        # Calculate Average Time in Stage (Stage Aging)
-        from validators import get_time_in_current_stage
-        
-        avg_aging_days = {}
-        for stage in STAGES:
-            items = WorkItem.query.filter_by(current_stage=stage).all()
-            if not items:
-                avg_aging_days[stage] = 0
-            else:
-                total_days = sum(get_time_in_current_stage(item).days for item in items)
-                avg_aging_days[stage] = round(total_days / len(items), 1)
 
         # Basic Regressions
-        regressions = db.session.query(TransitionLog.work_item_id)\
-                               .filter(TransitionLog.reason.isnot(None))\
-                               .group_by(TransitionLog.work_item_id)\
-                               .count()
-                               
+        regressions = db.session.scalar(
+            select(func.count(func.distinct(TransitionLog.work_item_id)))
+            .where(TransitionLog.reason.isnot(None))
+        )
+
         # Bottleneck detection: Where are regressions originating from?
         failure_origins = {stage: 0 for stage in STAGES}
-        for log in TransitionLog.query.filter(TransitionLog.reason.isnot(None)):
-            failure_origins[log.from_stage] = failure_origins.get(log.from_stage, 0) + 1
+        failure_origins.update(db.session.execute(
+            select(TransitionLog.from_stage, func.count())
+            .where(TransitionLog.reason.isnot(None))
+            .group_by(TransitionLog.from_stage)
+        ).all())
 
-        return jsonify({
+        return {
             "items_per_stage": items_per_stage,
             "total_items": total_items,
             "avg_aging_days": avg_aging_days,
             "total_stage_transitions": total_transitions,
             "items_with_regressions": regressions,
             "failure_origins": failure_origins
-        })
+        }
 
     def login_required(f):
         @wraps(f)
@@ -672,11 +1005,13 @@ def register_routes(app):
             if user and user.check_password(password):
                 session['user_id'] = user.id
                 session['username'] = user.username
+                session['role'] = user.role
                 return redirect(url_for("ui_board"))
             return render_template("login.html", error="Invalid credentials")
         return render_template("login.html")
 
     @app.route("/ui/register", methods=["GET", "POST"])
+    @serialized_write
     def ui_register():
         if request.method == "POST":
             username = request.form.get("username")
@@ -690,6 +1025,7 @@ def register_routes(app):
             db.session.commit()
             session['user_id'] = user.id
             session['username'] = user.username
+            session['role'] = user.role
             return redirect(url_for("ui_board"))
         return render_template("register.html")
 
@@ -700,6 +1036,7 @@ def register_routes(app):
 
     @app.route("/ui/projects", methods=["GET", "POST"])
     @login_required
+    @serialized_write
     def ui_projects():
         if request.method == "POST":
             name = request.form.get("name")
@@ -710,31 +1047,54 @@ def register_routes(app):
                 db.session.add(project)
                 db.session.commit()
                 return redirect(url_for("ui_projects"))
-        projects = Project.query.order_by(Project.created_at.desc()).all()
+        projects = db.session.execute(
+            select(Project.id, Project.name, Project.description, Project.sdlc_practice, Project.created_at)
+            .order_by(Project.created_at.desc(), Project.id.desc())
+        ).all()
         return render_template("projects.html", projects=projects)
 
+    # Board/metrics pages are static apart from the username in the layout header,
+    # so each (page, username) is rendered through Jinja once and then reused.
+    # Skipped in debug mode so template edits still show up immediately.
+    _page_cache = {}
+
+    def render_cached_page(template):
+        if app.debug:
+            return render_template(template, STAGES=STAGES)
+        key = (template, session.get('username'))
+        html = _page_cache.get(key)
+        if html is None:
+            html = _page_cache[key] = render_template(template, STAGES=STAGES)
+        return html
+
     # Optional: UI entry points (if you keep serving templates)
     @app.route("/ui/board")
     @login_required
     def ui_board():
-        return render_template("board.html")
+        return render_cached_page("board.html")
 
     @app.route("/ui/metrics")
     @login_required
     def ui_metrics():
-        return render_template("metrics.html")
+        return render_cached_page("metrics.html")
         
     @app.route("/ui/editor/<int:id>")
     @login_required
     def ui_editor(id):
-        work_item = WorkItem.query.get_or_404(id)
+        work_item = db.get_or_404(WorkItem, id)
         return render_template("editor.html", work_item=work_item)
         
     @app.route("/ui/compliance")
     @login_required
     def ui_compliance():
-        items = WorkItem.query.order_by(WorkItem.id.asc()).all()
-        for item in items:
-            item.artifacts_list = Artifact.query.filter_by(work_item_id=item.id).order_by(Artifact.created_at).all()
-            item.history_list = TransitionLog.query.filter_by(work_item_id=item.id).order_by(TransitionLog.transitioned_at).all()
-        return render_template("compliance.html", items=items)
\ No newline at end of file
+        # Items arrive 100 at a time, each batch followed by one SELECT ... IN per
+        # collection the page renders, and the HTML is flushed as the loop advances
+        # (TTFB and peak memory no longer scale with the item count).
+        # Only the columns the template shows are loaded (no description text).
+        items = WorkItem.query.options(
+            load_only(WorkItem.public_id, WorkItem.title, WorkItem.current_stage, WorkItem.assignee),
+            selectinload(WorkItem.artifacts),
+            selectinload(WorkItem.transition_logs),
+            raiseload('*')
+        ).order_by(WorkItem.id.asc()).yield_per(100)
+        return Response(stream_template("compliance.html", items=items))
\ No newline at end of file
@@ -1,5 +1,7 @@
 from models import Artifact, TransitionLog, db
+from sqlalchemy import func, select
 from datetime import datetime, timedelta
+from typing import NamedTuple
 import re
 
 
@@ -14,23 +16,29 @@ STAGES = [
     "Release"
 ]
 
+# Stage name → position, for O(1) ordering checks
+STAGE_INDEX = {stage: i for i, stage in enumerate(STAGES)}
+
+# Immutable tuples: shared as-is by STAGE_META, never copied
 REQUIRED_ARTIFACTS = {
-    "Requirement":    ["Requirement Document", "Stakeholder Approval"],
-    "Design":         ["High-Level Design Document", "Architecture Diagram", "Data Model"],
-    "Implementation": ["Source Code Reference", "Unit Test Coverage Report", "API Specification"],
-    "Testing":        ["Test Plan", "Test Cases", "Test Execution Report", "Defect Summary"],
-    "Release":        ["Release Notes", "Deployment Checklist", "Production Approval Record"]
+    "Requirement":    ("Requirement Document", "Stakeholder Approval"),
+    "Design":         ("High-Level Design Document", "Architecture Diagram", "Data Model"),
+    "Implementation": ("Source Code Reference", "Unit Test Coverage Report", "API Specification"),
+    "Testing":        ("Test Plan", "Test Cases", "Test Execution Report", "Defect Summary"),
+    "Release":        ("Release Notes", "Deployment Checklist", "Production Approval Record")
 }
 
-# Which artifacts require structured/validated reference
+# Which artifacts require structured/validated reference (compiled once at import)
 ARTIFACT_QUALITY_RULES = {
-    "Source Code Reference":      r"^[0-9a-f]{40}$|^[0-9a-f]{7}$",   # full or short git commit
-    "Unit Test Coverage Report":  r"^https?://",
-    "API Specification":          r"^https?://",
-    "Release Notes":              r"^https?://",
-    "Deployment Checklist":       r"^https?://",
-    # "Requirement Document":     no rule → reference optional
-    # "Stakeholder Approval":     no rule → reference optional
+    artifact_type: re.compile(pattern) for artifact_type, pattern in {
+        "Source Code Reference":      r"^[0-9a-f]{40}$|^[0-9a-f]{7}$",   # full or short git commit
+        "Unit Test Coverage Report":  r"^https?://",
+        "API Specification":          r"^https?://",
+        "Release Notes":              r"^https?://",
+        "Deployment Checklist":       r"^https?://",
+        # "Requirement Document":     no rule → reference optional
+        # "Stakeholder Approval":     no rule → reference optional
+    }.items()
 }
 
 STAGE_TIMEOUT_DAYS = {
@@ -46,6 +54,11 @@ MAX_ALLOWED_REGRESSIONS      = 3
 MAX_ALLOWED_TRANSITIONS      = 20
 
 WEAK_REASON_INDICATORS = {"fixed", "ok", "done", "bug", "error", "oops", "typo", "???", "whatever"}
+# All indicators in one case-insensitive alternation: a single pass over the reason
+_WEAK_REASON_RE = re.compile(
+    "|".join(re.escape(w) for w in sorted(WEAK_REASON_INDICATORS, key=len, reverse=True)),
+    re.IGNORECASE
+)
 
 # Which stages require special role to *leave* them
 REQUIRED_APPROVER_ROLES = {
@@ -55,41 +68,68 @@ REQUIRED_APPROVER_ROLES = {
     "Testing": ["Tester", "Admin", "Manager"],
     "Release": ["Manager", "Admin"]
 }
+# Membership-test forms of the role lists (the lists keep message order)
+_APPROVER_ROLE_SETS = {stage: frozenset(roles) for stage, roles in REQUIRED_APPROVER_ROLES.items()}
+_REGRESSION_ROLES = frozenset({"Manager", "Admin"})
+
+
+class StageMeta(NamedTuple):
+    """Everything validate_transition needs about one stage, fetched in one lookup."""
+    index: int
+    name: str
+    required_artifacts: tuple[str, ...]
+    timeout_days: int
+    overdue_after: timedelta       # whole days > timeout_days ⇔ elapsed >= timeout_days + 1 days
+    approver_roles: frozenset[str]
+
+
+# Positional, like STAGES: STAGE_META[get_stage_index(stage)]
+STAGE_META = tuple(
+    StageMeta(
+        index=i,
+        name=stage,
+        required_artifacts=REQUIRED_ARTIFACTS.get(stage, ()),
+        timeout_days=STAGE_TIMEOUT_DAYS.get(stage, 0),
+        overdue_after=timedelta(days=STAGE_TIMEOUT_DAYS.get(stage, 0) + 1),
+        approver_roles=_APPROVER_ROLE_SETS.get(stage, frozenset()),
+    )
+    for i, stage in enumerate(STAGES)
+)
 
 
 def is_valid_stage(stage: str) -> bool:
-    return stage in STAGES
+    return stage in STAGE_INDEX
 
 
 def get_stage_index(stage: str) -> int:
-    return STAGES.index(stage) if is_valid_stage(stage) else -1
-
-
-def get_required_artifacts(stage: str) -> list[str]:
-    return REQUIRED_ARTIFACTS.get(stage, [])
-
+    return STAGE_INDEX.get(stage, -1)
 
-def count_regressions(work_item) -> int:
-    logs = TransitionLog.query.filter_by(work_item_id=work_item.id).all()
-    count = 0
-    for i in range(1, len(logs)):
-        if get_stage_index(logs[i].to_stage) < get_stage_index(logs[i-1].to_stage):
-            count += 1
-    return count
-
-
-def count_total_transitions(work_item) -> int:
-    return TransitionLog.query.filter_by(work_item_id=work_item.id).count()
 
+def transition_stats(work_item) -> tuple[int, int]:
+    """
+    (regression count, total transitions) as ONE aggregate row, no log rows
+    fetched. Regressions are the logs carrying a justification - the same
+    definition as WorkItem.regression_count and /metrics.
+    """
+    total, regressions = db.session.execute(
+        select(func.count(), func.count(TransitionLog.reason))
+        .where(TransitionLog.work_item_id == work_item.id)
+    ).one()
+    return regressions, total
 
-def get_time_in_current_stage(work_item) -> timedelta:
-    last_entry = TransitionLog.query.filter_by(
-        work_item_id=work_item.id,
-        to_stage=work_item.current_stage
-    ).order_by(TransitionLog.transitioned_at.desc()).first()
 
-    start = last_entry.transitioned_at if last_entry else work_item.created_at
-    return datetime.utcnow() - start
+def stage_overdue_days(work_item, meta: StageMeta) -> int:
+    """
+    Whole days past the stage timeout (0 if not overdue). The common
+    not-overdue case is a single datetime comparison against a threshold.
+    """
+    if meta.timeout_days <= 0:
+        return 0
+    start = work_item.stage_entered_at or work_item.created_at
+    now = datetime.utcnow()
+    if start > now - meta.overdue_after:
+        return 0
+    return (now - start).days - meta.timeout_days
 
 
 def was_stage_exited(work_item, stage: str) -> bool:
@@ -97,10 +137,11 @@ def was_stage_exited(work_item, stage: str) -> bool:
     True if there is ANY record of leaving this stage in history.
     More robust than checking only the most recent log.
     """
-    return db.session.query(TransitionLog).filter(
+    exited = select(TransitionLog.id).where(
         TransitionLog.work_item_id == work_item.id,
         TransitionLog.from_stage == stage
-    ).first() is not None
+    ).exists()
+    return db.session.scalar(select(exited))
 
 
 def is_stage_locked(work_item, stage: str) -> tuple[bool, str]:
@@ -117,12 +158,7 @@ def is_stage_locked(work_item, stage: str) -> tuple[bool, str]:
     return False, "Stage still active — can add artifacts"
 
 
-def has_duplicate_artifact(work_item, stage: str, artifact_type: str) -> bool:
-    return Artifact.query.filter_by(
-        work_item_id=work_item.id,
-        stage=stage,
-        artifact_type=artifact_type
-    ).count() >= 1   # changed to 1 — most types should appear only once
+DUPLICATE_ARTIFACT_MSG = "Artifact of type '{artifact_type}' already exists in stage '{stage}'."
 
 
 def validate_artifact_quality(artifact_type: str, reference: str | None = None) -> tuple[bool, str]:
@@ -137,24 +173,31 @@ def validate_artifact_quality(artifact_type: str, reference: str | None = None)
         return False, f"Reference is required for artifact type '{artifact_type}'"
 
     pattern = ARTIFACT_QUALITY_RULES[artifact_type]
-    if not re.match(pattern, reference.strip()):
-        return False, f"Invalid format for '{artifact_type}'. Expected pattern: {pattern}"
+    if not pattern.match(reference.strip()):
+        return False, f"Invalid format for '{artifact_type}'. Expected pattern: {pattern.pattern}"
 
     return True, "Reference format valid"
 
 
-def validate_stage_approval(current_stage: str, user_role: str | None) -> tuple[bool, str]:
+def validate_stage_approval(
+    current_stage: str,
+    user_role: str | None,
+    allowed_roles: frozenset[str] | None = None
+) -> tuple[bool, str]:
     """
     Check if current user has permission to approve transition FROM this stage.
+    `allowed_roles` may be passed in from STAGE_META to skip the lookup.
     """
     if not user_role:
         return False, "User role is required to transition stages in Enterprise mode."
         
-    required_roles = REQUIRED_APPROVER_ROLES.get(current_stage)
-    if not required_roles:
+    if allowed_roles is None:
+        allowed_roles = _APPROVER_ROLE_SETS.get(current_stage)
+    if not allowed_roles:
         return True, "No special approval required"
 
-    if user_role not in required_roles:
+    if user_role not in allowed_roles:
+        required_roles = REQUIRED_APPROVER_ROLES[current_stage]
         return False, f"Unauthorized: Only {', '.join(required_roles)} can approve transition from '{current_stage}'"
 
     return True, "Approval role verified"
@@ -183,75 +226,80 @@ def validate_transition(
     if curr_idx == -1 or targ_idx == -1:
         return False, "Internal stage error", {}
 
-    if curr_idx == targ_idx:
+    # One direction test, then a specialised path per direction. Rejections
+    # that don't depend on history are decided before any DB work.
+    step = targ_idx - curr_idx
+    if step == 0:
         return False, f"Already in stage '{current_stage}'", {}
+    if step > 1:
+        return False, f"Stage skipping not allowed. Next allowed stage: {STAGES[curr_idx + 1]}", {}
+    if step < 0 and user_role not in _REGRESSION_ROLES:
+        return False, "Unauthorized: Only Managers or Admins can approve a regression.", {}
 
+    regression_count, total_transitions = transition_stats(work_item)
     extra = {
-        "regression_count": count_regressions(work_item),
-        "total_transitions": count_total_transitions(work_item)
+        "regression_count": regression_count,
+        "total_transitions": total_transitions
     }
 
-    if extra["total_transitions"] >= MAX_ALLOWED_TRANSITIONS:
+    if total_transitions >= MAX_ALLOWED_TRANSITIONS:
         return False, f"Work item has reached maximum transitions ({MAX_ALLOWED_TRANSITIONS}).", extra
 
-    # Forward transition
-    if targ_idx == curr_idx + 1:
-        complete, missing = check_artifacts_complete(work_item, current_stage)
-        if not complete:
-            return False, f"Cannot advance: missing {', '.join(missing)}", extra
+    if step == 1:
+        return _validate_forward(work_item, target_stage, user_role, STAGE_META[curr_idx], extra)
+    return _validate_regression(regression_reason, extra)
+
 
-        approval_ok, approval_msg = validate_stage_approval(current_stage, user_role)
-        if not approval_ok:
-            return False, approval_msg, extra
+def _validate_forward(work_item, target_stage: str, user_role: str | None, meta: StageMeta, extra: dict) -> tuple[bool, str, dict]:
+    # Role check is in-memory, so it runs before the artifact query
+    approval_ok, approval_msg = validate_stage_approval(meta.name, user_role, meta.approver_roles)
+    if not approval_ok:
+        return False, approval_msg, extra
 
-        # Overdue warning (non-blocking)
-        days_in_stage = get_time_in_current_stage(work_item).days
-        timeout = STAGE_TIMEOUT_DAYS.get(current_stage, 0)
-        if timeout > 0 and days_in_stage > timeout:
-            extra["warning"] = f"Warning: stage '{current_stage}' is overdue ({days_in_stage - timeout} days)"
+    missing = _missing_artifacts(work_item.id, meta.name, meta.required_artifacts)
+    if missing:
+        return False, f"Cannot advance: missing {', '.join(missing)}", extra
 
-        return True, f"Transition to '{target_stage}' approved.", extra
+    # Overdue warning (non-blocking)
+    overdue_days = stage_overdue_days(work_item, meta)
+    if overdue_days:
+        extra["warning"] = f"Warning: stage '{meta.name}' is overdue ({overdue_days} days)"
 
-    if targ_idx > curr_idx + 1:
-        return False, f"Stage skipping not allowed. Next allowed stage: {STAGES[curr_idx + 1]}", extra
+    return True, f"Transition to '{target_stage}' approved.", extra
 
-    # Regression
-    if targ_idx < curr_idx:
-        if user_role not in ["Manager", "Admin"]:
-            return False, "Unauthorized: Only Managers or Admins can approve a regression.", extra
-            
-        if extra["regression_count"] >= MAX_ALLOWED_REGRESSIONS:
-            return False, f"Maximum regressions ({MAX_ALLOWED_REGRESSIONS}) reached.", extra
 
-        if not regression_reason or not regression_reason.strip():
-            return False, "Regression justification is required.", extra
+def _validate_regression(regression_reason: str | None, extra: dict) -> tuple[bool, str, dict]:
+    if extra["regression_count"] >= MAX_ALLOWED_REGRESSIONS:
+        return False, f"Maximum regressions ({MAX_ALLOWED_REGRESSIONS}) reached.", extra
 
-        reason = regression_reason.strip()
-        if len(reason) < MIN_REGRESSION_REASON_LENGTH:
-            return False, f"Reason must be at least {MIN_REGRESSION_REASON_LENGTH} characters.", extra
+    if not regression_reason or not regression_reason.strip():
+        return False, "Regression justification is required.", extra
 
-        weak = [w for w in WEAK_REASON_INDICATORS if w in reason.lower()]
-        if weak:
-            extra["warning"] = f"Weak regression reason keywords: {', '.join(weak)}"
+    reason = regression_reason.strip()
+    if len(reason) < MIN_REGRESSION_REASON_LENGTH:
+        return False, f"Reason must be at least {MIN_REGRESSION_REASON_LENGTH} characters.", extra
 
-        return True, f"Regression allowed (#{extra['regression_count'] + 1}).", extra
+    weak = list(dict.fromkeys(m.lower() for m in _WEAK_REASON_RE.findall(reason)))
+    if weak:
+        extra["warning"] = f"Weak regression reason keywords: {', '.join(weak)}"
 
-    return False, "Invalid transition direction", extra
+    return True, f"Regression allowed (#{extra['regression_count'] + 1}).", extra
 
 
-def check_artifacts_complete(work_item, for_stage: str | None = None) -> tuple[bool, list[str]]:
-    stage = for_stage or work_item.current_stage
-    required = get_required_artifacts(stage)
+def _missing_artifacts(work_item_id: int, stage: str, required: tuple[str, ...]) -> list[str]:
     if not required:
-        return True, []
+        return []
 
-    present = {a.artifact_type for a in Artifact.query.filter_by(
-        work_item_id=work_item.id,
-        stage=stage
-    ).all()}
+    # One query for all required types, only the type column - no ORM hydration
+    present = set(db.session.scalars(
+        select(Artifact.artifact_type).where(
+            Artifact.work_item_id == work_item_id,
+            Artifact.stage == stage,
+            Artifact.artifact_type.in_(required)
+        )
+    ))
 
-    missing = [r for r in required if r not in present]
-    return len(missing) == 0, missing
+    return [r for r in required if r not in present]
 
 
 def can_add_artifact(
@@ -260,13 +308,12 @@ def can_add_artifact(
     artifact_type: str,
     reference: str | None = None
 ) -> tuple[bool, str]:
+    # Only the exit-history probe runs here; duplicates are caught by the
+    # artifacts unique constraint when the caller INSERTs (see DUPLICATE_ARTIFACT_MSG)
     locked, reason = is_stage_locked(work_item, stage)
     if locked:
         return False, reason
 
-    if has_duplicate_artifact(work_item, stage, artifact_type):
-        return False, f"Artifact of type '{artifact_type}' already exists in stage '{stage}'."
-
     quality_ok, quality_msg = validate_artifact_quality(artifact_type, reference)
     if not quality_ok:
         return False, quality_msg